@@ -0,0 +1,197 @@
+"""On-disk cache of Anthropic responses, used to make repeated dev runs cheap.
+
+Enabled by setting WORKSTREAM_LLM_CACHE=1. Every prompt in the workstream is
+sent with temperature 0, so an identical request is answered from disk instead
+of the API.
+"""
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import anthropic
+from anthropic.types import Message
+
+
+CACHE_ENV_VAR = "WORKSTREAM_LLM_CACHE"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "workstream"
+
+# Request options that do not change the response.
+_TRANSPORT_ARGS = ("extra_headers", "extra_query", "extra_body", "timeout")
+
+
+def cache_enabled() -> bool:
+    return os.getenv(CACHE_ENV_VAR) == "1"
+
+
+def _request_key(kwargs: Dict) -> str:
+    payload = {key: value for key, value in kwargs.items() if key not in _TRANSPORT_ARGS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _ReplayStream:
+    """Stands in for a MessageStream when the reply is already cached."""
+
+    def __init__(self, message: Message):
+        self._message = message
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+    @property
+    def text_stream(self):
+        for block in self._message.content:
+            if block.type == "text":
+                yield block.text
+
+    def get_final_message(self) -> Message:
+        return self._message
+
+
+class _RecordingStream:
+    """Wraps a live MessageStream and caches the final message."""
+
+    def __init__(self, manager, record: Callable[[Message], None]):
+        self._manager = manager
+        self._record = record
+        self._stream = None
+
+    def __enter__(self):
+        self._stream = self._manager.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._manager.__exit__(*exc_info)
+
+    @property
+    def text_stream(self):
+        return self._stream.text_stream
+
+    def get_final_message(self) -> Message:
+        message = self._stream.get_final_message()
+        self._record(message)
+        return message
+
+
+class _AsyncReplayStream(_ReplayStream):
+    """Async counterpart of _ReplayStream."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    @property
+    async def text_stream(self):
+        for block in self._message.content:
+            if block.type == "text":
+                yield block.text
+
+    async def get_final_message(self) -> Message:
+        return self._message
+
+
+class _AsyncRecordingStream(_RecordingStream):
+    """Async counterpart of _RecordingStream."""
+
+    async def __aenter__(self):
+        self._stream = await self._manager.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._manager.__aexit__(*exc_info)
+
+    async def get_final_message(self) -> Message:
+        message = await self._stream.get_final_message()
+        self._record(message)
+        return message
+
+
+class _CachedMessages:
+    def __init__(self, messages, cache_dir: Path):
+        self._messages = messages
+        self._cache_dir = cache_dir
+
+    def _load(self, key: str) -> Optional[Message]:
+        path = self._cache_dir / f"{key}.pkl"
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _store(self, key: str, message: Message) -> None:
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._cache_dir / f"{key}.pkl", "wb") as f:
+            pickle.dump(message, f)
+
+    def create(self, **kwargs) -> Message:
+        key = _request_key(kwargs)
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+
+        message = self._messages.create(**kwargs)
+        self._store(key, message)
+        return message
+
+    def stream(self, **kwargs):
+        key = _request_key(kwargs)
+        cached = self._load(key)
+        if cached is not None:
+            return _ReplayStream(cached)
+
+        return _RecordingStream(self._messages.stream(**kwargs), lambda message: self._store(key, message))
+
+    def __getattr__(self, name):
+        return getattr(self._messages, name)
+
+
+class _AsyncCachedMessages(_CachedMessages):
+    async def create(self, **kwargs) -> Message:
+        key = _request_key(kwargs)
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+
+        message = await self._messages.create(**kwargs)
+        self._store(key, message)
+        return message
+
+    def stream(self, **kwargs):
+        key = _request_key(kwargs)
+        cached = self._load(key)
+        if cached is not None:
+            return _AsyncReplayStream(cached)
+
+        return _AsyncRecordingStream(self._messages.stream(**kwargs), lambda message: self._store(key, message))
+
+
+class CachedAnthropic:
+    """anthropic.Anthropic with messages.create/stream answered from disk when possible."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, **client_kwargs):
+        self._client = anthropic.Anthropic(**client_kwargs)
+        self.messages = _CachedMessages(self._client.messages, Path(cache_dir))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class CachedAsyncAnthropic:
+    """anthropic.AsyncAnthropic with messages.create/stream answered from disk when possible."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, **client_kwargs):
+        self._client = anthropic.AsyncAnthropic(**client_kwargs)
+        self.messages = _AsyncCachedMessages(self._client.messages, Path(cache_dir))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
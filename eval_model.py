@@ -0,0 +1,78 @@
+"""Optional local ADD/STORE classifier for incoming messages.
+
+A TF-IDF + logistic regression pipeline scores how likely a message is to be
+added to the timeline. Workstream uses it to keep clearly routine messages as
+pending context without calling the API. Train one from a JSONL file of
+{"text": ..., "label": "ADD" | "STORE"} records:
+
+    python eval_model.py labeled_messages.jsonl eval_model.joblib
+
+and point WORKSTREAM_EVAL_MODEL (or Workstream's eval_model_path) at the
+result. scikit-learn and joblib are only needed when a model is used.
+"""
+import json
+import os
+import sys
+from typing import List, Optional
+
+
+EVAL_MODEL_ENV_VAR = "WORKSTREAM_EVAL_MODEL"
+
+# Messages scored at or below this probability of ADD are stored locally.
+STORE_THRESHOLD = 0.35
+
+
+def train_eval_model(texts: List[str], labels: List[str], path: str):
+    """Fit the classifier on labeled messages and save it to path."""
+    import joblib
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    pipeline = Pipeline([
+        ("tfidf", TfidfVectorizer(ngram_range=(1, 2))),
+        ("clf", LogisticRegression()),
+    ])
+    pipeline.fit(texts, [1 if label.upper() == "ADD" else 0 for label in labels])
+    joblib.dump(pipeline, path)
+    return pipeline
+
+
+def load_eval_model(path: Optional[str] = None):
+    """Load a trained classifier, or return None if none is configured or available."""
+    path = path or os.getenv(EVAL_MODEL_ENV_VAR)
+    if not path:
+        return None
+
+    try:
+        import joblib
+        return joblib.load(path)
+    except ImportError:
+        print("Warning: joblib is not installed, skipping local message evaluation")
+    except Exception as e:
+        print(f"Warning: could not load evaluation model from {path}: {e}")
+    return None
+
+
+def add_probability(model, text: str) -> Optional[float]:
+    """Probability that text should be added, or None if the model fails to score it."""
+    try:
+        return float(model.predict_proba([text])[0, 1])
+    except Exception as e:
+        print(f"Warning: local message evaluation failed: {e}")
+        return None
+
+
+def main():
+    if len(sys.argv) != 3:
+        raise SystemExit("usage: python eval_model.py LABELED_MESSAGES.jsonl MODEL_PATH")
+
+    with open(sys.argv[1]) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    train_eval_model([r["text"] for r in records], [r["label"] for r in records], sys.argv[2])
+    print(f"Trained on {len(records)} messages, saved to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -150,31 +150,42 @@ def main():
     # Process messages
     messages = create_test_messages()
 
-    for i, message in enumerate(messages, 1):
-        print(f"\nProcessing message {i}/{len(messages)}")
-        print(f"Timestamp: {message.timestamp}")
-        print(f"Stream: {message.stream_id}")
-        print(f"Content: {message.text}")
-
-        was_added = workstream.process_message(message)
-
-        print(f"\nMessage {'added to timeline' if was_added else 'stored as context'}")
-
-        # Write timeline and summary to files
-        timeline_path = test_dir / "timeline.txt"
-        summary_path = test_dir / "summary.txt"
-
-        with open(timeline_path, "w") as t:
-            t.write(workstream.timeline)
-
-        with open(summary_path, "w") as s:
-            s.write(workstream.summary)
-
-        # Optional: uncomment to see full timeline
-        print("\nFull Timeline:")
-        print(workstream.timeline)
-
-        input("Press Enter to continue to next message...")
+    # Timeline is append-only, so only new text is written each iteration;
+    # the summary is rewritten in place.
+    timeline_path = test_dir / "timeline.txt"
+    summary_path = test_dir / "summary.txt"
+    last_timeline_len = 0
+
+    with open(timeline_path, "w") as t, open(summary_path, "w") as s:
+        def write_summary(summary: str) -> None:
+            s.seek(0)
+            s.write(summary)
+            s.truncate()
+            s.flush()
+
+        for i, message in enumerate(messages, 1):
+            print(f"\nProcessing message {i}/{len(messages)}")
+            print(f"Timestamp: {message.timestamp}")
+            print(f"Stream: {message.stream_id}")
+            print(f"Content: {message.text}")
+
+            was_added = workstream.process_message(message, on_summary=write_summary)
+
+            print(f"\nMessage {'added to timeline' if was_added else 'stored as context'}")
+
+            # Write timeline delta and summary to files
+            timeline = workstream.timeline
+            t.write(timeline[last_timeline_len:])
+            t.flush()
+            last_timeline_len = len(timeline)
+
+            write_summary(workstream.summary)
+
+            # Optional: uncomment to see full timeline
+            print("\nFull Timeline:")
+            print(timeline)
+
+            input("Press Enter to continue to next message...")
 
 
 if __name__ == "__main__":
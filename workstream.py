@@ -1,61 +1,38 @@
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, FrozenSet, Optional, Tuple
+import asyncio
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import re
 import anthropic
+import httpx
 
+from _llm_cache import CachedAnthropic, CachedAsyncAnthropic, _request_key, cache_enabled
+from eval_model import STORE_THRESHOLD, add_probability, load_eval_model
 
-@dataclass
-class IncomingMessage:
-    timestamp: datetime
-    text: str
-    stream_id: str
 
+logger = logging.getLogger(__name__)
 
-@dataclass
-class Document:
-    content: str
-    metadata: Dict[str, str]
-    timestamp: datetime
+DEFAULT_MODEL = "claude-3-5-haiku-latest"
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
 
+# Assistant prefill for the update call: the first generated token is the
+# decision, so a STORE reply is only a handful of tokens.
+UPDATE_PREFILL = '{"decision": "'
 
-class Workstream:
-    def __init__(
-            self,
-            name: str,
-            streams: List[str],
-            api_key: str,
-            baseline_docs: Optional[List[Document]] = None
-    ):
-        self.name = name
-        self.timeline = ""
-        self.summary = ""
-        self.subscribed_streams = set(streams)
-        self.client = anthropic.Anthropic(api_key=api_key)
-        self.documents = baseline_docs or []
-        self.pending_context = []
-
-    def add_document(self, document: Document) -> None:
-        self.documents.append(document)
-
-    def _build_context_section(self) -> str:
-        context = "\nREFERENCE DOCUMENTS:\n"
-        for doc in self.documents:
-            context += f"\n[{doc.timestamp}] {doc.metadata.get('title', 'Document')}:\n{doc.content}\n"
+# Prompt templates for the update call. The system prompt is rendered once per
+# workstream so it is byte-identical, and cacheable, across calls.
+UPDATE_SYSTEM_TEMPLATE = """
+WORKSTREAM UPDATE
+Project: {name}
 
-        if self.pending_context:
-            context += "\nPENDING UPDATES:\n"
-            for msg in self.pending_context:
-                context += f"\n[{msg.timestamp}] {msg.stream_id}: {msg.text}"
-
-        return context
-
-    def _evaluate_message(self, message: IncomingMessage, context_section: str) -> bool:
-        evaluation_prompt = f"""
-MESSAGE EVALUATION
-Workstream: {self.name}
-Timestamp: {message.timestamp}
-Stream: {message.stream_id}
-Content: {message.text}
+Decide whether the new message, together with any pending updates, belongs in the
+timeline, and if so write the timeline entry and the refreshed summary.
 
 CRITERIA:
 - Significant progress or milestones
@@ -65,126 +42,502 @@ CRITERIA:
 - Performance or reliability impacts
 
 NOTE: MOST messages should be added into pending updates. 
-Only when pending updates amount to a substantive update should you respond with "ADD"
+Only when pending updates amount to a substantive update should you decide "ADD"
+
+TIMELINE ENTRY FORMAT:
+[TIMESTAMP]
+<Entry Text>
+- Key points and decisions
+- Current blockers
+- Next steps
+REF: Related documents and links
+
+SUMMARY MUST INCLUDE:
+- Current project state
+- Major milestones and decisions
+- Known issues and blockers
+- Next critical steps
+Maximum 300 words.
 
-CURRENT TIMELINE:
-{self.timeline}
+RESPONSE FORMAT:
+Respond with a single JSON object and nothing else:
+{{"decision": "ADD", "timeline_entry": "<ONE timeline entry>", "summary": "<summary document>"}}
+or, when the message should be stored as a pending update:
+{{"decision": "STORE"}}
+Do NOT address me in the entry or summary. Do NOT write anything meta in them.
+"""
 
-CONTEXT:
-{context_section}
+UPDATE_MESSAGE_TEMPLATE = """
+NEW UPDATE:
+Timestamp: {timestamp}
+Stream: {stream_id}
+Message: {text}
 
-Respond with exactly one word: ADD or STORE
+Respond with the JSON object only.
 """
 
-        try:
-            evaluation_response = self.client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=10,  # Increased from 1 to allow for proper response
-                temperature=0,
-                messages=[{
-                    "role": "user",
-                    "content": evaluation_prompt
-                }]
-            )
+# Number of most recent timeline entries sent in prompts alongside the rolling
+# summary; older entries are only kept locally.
+TIMELINE_WINDOW = 5
+
+# Messages without any of these signals are stored as pending context without
+# an API call until PENDING_BATCH_SIZE of them have accumulated.
+SIGNAL_PATTERN = re.compile(
+    r"\b(decision|decided|merged?|deploy\w*|releas\w*|block\w*|incident|outage|"
+    r"reveal\w*|approv\w*|complet\w*|milestone|launch\w*|fail\w*|leak\w*|"
+    r"regress\w*|roll\w*back)\b",
+    re.IGNORECASE
+)
+MIN_SIGNAL_LENGTH = 20
+PENDING_BATCH_SIZE = 5
+
+# Past PENDING_LIMIT pending messages, the oldest half is collapsed into a
+# single digest message of truncated texts. An earlier digest in that half is
+# carried over, and the digest keeps only its newest DIGEST_MAX_LENGTH
+# characters, so pending updates never exceed roughly PENDING_LIMIT messages
+# plus one capped digest.
+PENDING_LIMIT = 20
+DIGEST_TEXT_LENGTH = 80
+DIGEST_MAX_LENGTH = PENDING_LIMIT * DIGEST_TEXT_LENGTH
+DIGEST_STREAM_ID = "digest"
+
+# Once the rendered documents exceed RELEVANCE_MIN_DOCS_CHARS, prompts carry
+# only the paragraphs most similar to the incoming message. Smaller document
+# sets are sent in full, where the prompt cache makes them cheap anyway.
+RELEVANCE_MODEL = "all-MiniLM-L6-v2"
+RELEVANCE_MIN_DOCS_CHARS = 20000
+RELEVANCE_TOP_K = 8
+RELEVANCE_MIN_SCORE = 0.2
+
+_embedder = None
+
+# In-process memo of update replies, keyed the same way as the on-disk cache,
+# so a repeated request within one run (e.g. a retried message) is free.
+RESPONSE_MEMO_SIZE = 1024
+_RESPONSE_MEMO: "OrderedDict[str, object]" = OrderedDict()
+
+
+@dataclass(slots=True, frozen=True)
+class IncomingMessage:
+    timestamp: datetime
+    text: str
+    stream_id: str
+
+
+@dataclass(slots=True, frozen=True)
+class Document:
+    content: str
+    metadata: Dict[str, str] = field(hash=False)
+    timestamp: datetime
 
-            if not evaluation_response.content:
-                print(f"Warning: Empty response received: {evaluation_response}")
-                return True  # Default to adding if we get an empty response
 
-            response_text = evaluation_response.content[0].text.strip().upper()
-            print(f"Evaluation response: {response_text}")  # Debug line
+# Sync clients are shared per API key so that workstreams reuse one connection
+# pool instead of each paying for its own TCP/TLS setup. Async clients are not
+# shared: their pools are bound to the event loop that opened them.
+_DEFAULT_CLIENTS: Dict[str, anthropic.Anthropic] = {}
 
-            return response_text == "ADD"
 
+def _get_default_client(api_key: str) -> anthropic.Anthropic:
+    if api_key not in _DEFAULT_CLIENTS:
+        if cache_enabled():
+            _DEFAULT_CLIENTS[api_key] = CachedAnthropic(api_key=api_key, max_retries=3)
+        else:
+            _DEFAULT_CLIENTS[api_key] = anthropic.Anthropic(api_key=api_key, max_retries=3)
+    return _DEFAULT_CLIENTS[api_key]
+
+
+def _make_async_client(api_key: str) -> anthropic.AsyncAnthropic:
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+    client_class = CachedAsyncAnthropic if cache_enabled() else anthropic.AsyncAnthropic
+    return client_class(
+        api_key=api_key,
+        max_retries=3,
+        http_client=http_client
+    )
+
+
+def _get_embedder():
+    # sentence-transformers is optional; without it prompts always carry the
+    # full documents.
+    global _embedder
+    if _embedder is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+            _embedder = SentenceTransformer(RELEVANCE_MODEL)
+        except ImportError:
+            _embedder = False
         except Exception as e:
-            print(f"Error during message evaluation: {e}")
-            return True  # Default to adding if there's an error
+            print(f"Warning: could not load {RELEVANCE_MODEL}, sending full documents: {e}")
+            _embedder = False
+    return _embedder or None
+
+
+def _parse_update(text: str) -> Dict[str, str]:
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        update = json.loads(match.group(0) if match else text)
+        if isinstance(update, dict):
+            return {key: value for key, value in update.items() if isinstance(value, str)}
+    except json.JSONDecodeError:
+        pass
+
+    # Fall back to pulling out each field, which also copes with a reply that
+    # was cut off by max_tokens part way through the summary.
+    update = {}
+    for key in ("decision", "timeline_entry", "summary"):
+        found = re.search(rf'"{key}"\s*:\s*"((?:[^"\\]|\\.)*)', text, re.DOTALL)
+        if found:
+            try:
+                update[key] = json.loads(f'"{found.group(1)}"')
+            except json.JSONDecodeError:
+                update[key] = found.group(1)
+    return update
+
+
+class _SummaryStream:
+    # Accumulates a streamed update reply and reports the summary field each
+    # time more of it has arrived.
+    def __init__(self, on_summary: Callable[[str], None]):
+        self.on_summary = on_summary
+        self.buffer = io.StringIO()
+        self.summary = ""
 
-    def process_message(self, message: IncomingMessage) -> bool:
-        if message.stream_id not in self.subscribed_streams:
-            return False
+    def feed(self, text: str) -> None:
+        self.buffer.write(text)
+        reply = self.buffer.getvalue()
+        if '"summary"' not in reply:
+            return
 
-        context_section = self._build_context_section()
-        should_add = self._evaluate_message(message, context_section)
+        summary = _parse_update(UPDATE_PREFILL + reply).get("summary", "")
+        if summary != self.summary:
+            self.summary = summary
+            self.on_summary(summary)
 
-        if not should_add:
-            self.pending_context.append(message)
-            return False
 
-        timeline_prompt = f"""
-WORKSTREAM TIMELINE DOCUMENT
-Project: {self.name}
-Last Updated: {message.timestamp}
+def _recall_response(request_key: str, on_summary: Optional[Callable[[str], None]] = None):
+    response = _RESPONSE_MEMO.get(request_key)
+    if response is not None:
+        _RESPONSE_MEMO.move_to_end(request_key)
+        if on_summary is not None:
+            _SummaryStream(on_summary).feed(response.content[0].text)
+    return response
 
-ENTRY FORMAT:
-[TIMESTAMP]
-<Entry Text>
-- Key points and decisions
-- Current blockers
-- Next steps
-REF: Related documents and links
 
-CURRENT TIMELINE:
-{self.timeline}
+def _remember_response(request_key: str, response) -> None:
+    if not response.content:
+        return
+    _RESPONSE_MEMO[request_key] = response
+    if len(_RESPONSE_MEMO) > RESPONSE_MEMO_SIZE:
+        _RESPONSE_MEMO.popitem(last=False)
 
-CONTEXT:
-{context_section}
 
-NEW UPDATE:
-Stream: {message.stream_id}
-Message: {message.text}
+def _text_block(text: str, cache: bool = False) -> Dict:
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
 
-Remember: ONLY respond with ONE timeline update. Do NOT address me in the response. 
-Do NOT write anything meta in the response.
-"""
 
-        timeline_response = self.client.messages.create(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=1000,
-            temperature=0,
-            messages=[{
-                "role": "user",
-                "content": timeline_prompt
-            }]
+class Workstream:
+    def __init__(
+            self,
+            name: str,
+            streams: List[str],
+            api_key: str,
+            baseline_docs: Optional[List[Document]] = None,
+            model: str = DEFAULT_MODEL,
+            client: Optional[anthropic.Anthropic] = None,
+            aclient: Optional[anthropic.AsyncAnthropic] = None,
+            eval_model_path: Optional[str] = None
+    ):
+        self.name = name
+        self.timeline_entries: List[str] = []
+        self.summary = ""
+        self.subscribed_streams: FrozenSet[str] = frozenset(streams)
+        self.client = client or _get_default_client(api_key)
+        # Created on first async use unless given; pass one aclient to several
+        # workstreams to share a pool within a single event loop, or when
+        # calling aprocess_message from many separate event loops.
+        self.aclient = aclient
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._api_key = api_key
+        self.model = model
+        self._update_system = UPDATE_SYSTEM_TEMPLATE.format(name=name)
+        self._local_eval = load_eval_model(eval_model_path)
+        self.documents = []
+        self.pending_context = []
+        self._doc_renders: List[Tuple[Document, str]] = []
+        self._docs_cache: Optional[str] = None
+        self._docs_fingerprint = ""
+        self._doc_chunks: List[str] = []
+        self._doc_embs = None
+        for document in baseline_docs or []:
+            self.add_document(document)
+
+    @property
+    def timeline(self) -> str:
+        return "".join("\n" + entry for entry in self.timeline_entries)
+
+    def add_document(self, document: Document) -> None:
+        # Each document is rendered once, here, and always emitted in insertion
+        # order so the cached prompt prefix stays byte-identical between calls.
+        rendered = f"\n[{document.timestamp}] {document.metadata.get('title', 'Document')}:\n{document.content}\n"
+        self.documents.append(document)
+        self._doc_renders.append((document, rendered))
+        self._docs_cache = None
+
+        title = document.metadata.get('title', 'Document')
+        for paragraph in re.split(r"\n\s*\n", document.content):
+            if paragraph.strip():
+                self._doc_chunks.append(f"\n[{document.timestamp}] {title}:\n{paragraph.strip()}\n")
+        self._doc_embs = None
+
+    def _docs_section(self) -> str:
+        if self._docs_cache is None:
+            buffer = io.StringIO()
+            buffer.write("\nREFERENCE DOCUMENTS:\n")
+            for _, rendered in self._doc_renders:
+                buffer.write(rendered)
+            self._docs_cache = buffer.getvalue()
+            self._docs_fingerprint = hashlib.sha1(self._docs_cache.encode()).hexdigest()
+            logger.debug("Workstream %s reference documents fingerprint: %s", self.name, self._docs_fingerprint)
+        return self._docs_cache
+
+    def _relevant_docs_block(self, message: IncomingMessage) -> Optional[str]:
+        if len(self._docs_section()) < RELEVANCE_MIN_DOCS_CHARS:
+            return None
+
+        embedder = _get_embedder()
+        if embedder is None:
+            return None
+
+        try:
+            if self._doc_embs is None:
+                self._doc_embs = embedder.encode(self._doc_chunks, normalize_embeddings=True)
+            scores = self._doc_embs @ embedder.encode(message.text, normalize_embeddings=True)
+            top = [i for i in scores.argsort()[::-1][:RELEVANCE_TOP_K] if scores[i] >= RELEVANCE_MIN_SCORE]
+        except Exception as e:
+            print(f"Warning: document relevance scoring failed, sending full documents: {e}")
+            return None
+        if not top:
+            return None
+
+        return "\nREFERENCE DOCUMENT EXCERPTS:\n" + "".join([self._doc_chunks[i] for i in sorted(top)])
+
+    def _pending_section(self) -> str:
+        if not self.pending_context:
+            return ""
+        return "\nPENDING UPDATES:\n" + "".join(
+            [f"\n[{msg.timestamp}] {msg.stream_id}: {msg.text}" for msg in self.pending_context]
         )
-        timeline_update = timeline_response.content[0].text
 
-        summary_prompt = f"""
-WORKSTREAM SUMMARY DOCUMENT
-Project: {self.name}
+    def _context_blocks(self, message: IncomingMessage) -> List[Dict]:
+        # Stable prefix first so it can be served from the prompt cache:
+        # baseline documents, then the summary and recent timeline, which only
+        # change when an entry is added. Pending updates vary per call.
+        # Per-message document excerpts are never cacheable, so they go after
+        # the history instead of ahead of it.
+        history = ""
+        if self.summary:
+            history += f"CURRENT SUMMARY:\n{self.summary}\n"
+        if self.timeline_entries:
+            recent = "\n".join(self.timeline_entries[-TIMELINE_WINDOW:])
+            history += f"\nRECENT TIMELINE:\n{recent}\n"
+
+        blocks = []
+        excerpts = self._relevant_docs_block(message)
+        if excerpts is None:
+            blocks.append(_text_block("CONTEXT:\n" + self._docs_section(), cache=True))
+        if history:
+            blocks.append(_text_block(history, cache=True))
+        if excerpts is not None:
+            blocks.append(_text_block("CONTEXT:\n" + excerpts))
+
+        pending = self._pending_section()
+        if pending:
+            blocks.append(_text_block(pending))
+        return blocks
+
+    def _request(self, system: str, content: List[Dict], prefill: Optional[str] = None, **kwargs) -> Dict:
+        messages = [{
+            "role": "user",
+            "content": content
+        }]
+        if prefill:
+            messages.append({
+                "role": "assistant",
+                "content": prefill
+            })
+
+        return dict(
+            system=[_text_block(system, cache=True)],
+            messages=messages,
+            extra_headers=PROMPT_CACHING_HEADERS,
+            **kwargs
+        )
 
-INCLUDE:
-- Current project state
-- Major milestones and decisions
-- Known issues and blockers
-- Next critical steps
-Maximum 300 words.
+    def _store_pending(self, message: IncomingMessage) -> None:
+        self.pending_context.append(message)
+        if len(self.pending_context) <= PENDING_LIMIT:
+            return
 
-TIMELINE: 
-{self.timeline}
+        oldest = self.pending_context[:PENDING_LIMIT // 2]
+        digest = "; ".join(
+            msg.text if msg.stream_id == DIGEST_STREAM_ID or len(msg.text) <= DIGEST_TEXT_LENGTH
+            else msg.text[:DIGEST_TEXT_LENGTH] + "…"
+            for msg in oldest
+        )
+        if len(digest) > DIGEST_MAX_LENGTH:
+            digest = "…" + digest[-(DIGEST_MAX_LENGTH - 1):]
+        self.pending_context = [
+            IncomingMessage(timestamp=oldest[-1].timestamp, text=digest, stream_id=DIGEST_STREAM_ID)
+        ] + self.pending_context[PENDING_LIMIT // 2:]
+
+    def _cheap_should_consider(self, message: IncomingMessage) -> bool:
+        return len(message.text) >= MIN_SIGNAL_LENGTH and SIGNAL_PATTERN.search(message.text) is not None
+
+    async def _async_client(self) -> anthropic.AsyncAnthropic:
+        # A client created here is replaced when called from a new event loop,
+        # since its keep-alive connections belong to the previous (closed) one.
+        # The stale client is closed on a best-effort basis; callers driving
+        # many short-lived loops should pass their own aclient instead.
+        loop = asyncio.get_running_loop()
+        if self.aclient is None or (self._aclient_loop is not None and self._aclient_loop is not loop):
+            stale = self.aclient
+            self.aclient = _make_async_client(self._api_key)
+            self._aclient_loop = loop
+            if stale is not None:
+                try:
+                    await stale.close()
+                except Exception as e:
+                    logger.debug("Could not close async client from a previous event loop: %s", e)
+        return self.aclient
+
+    def _needs_update_call(self, message: IncomingMessage) -> bool:
+        if message.stream_id not in self.subscribed_streams:
+            return False
 
-NEW UPDATE:
-{timeline_update}
+        # A trained local classifier, when configured, replaces the keyword
+        # heuristic. Only an API call can write the entry and summary, so a
+        # confident ADD still goes to Claude; a confident STORE never does,
+        # however many messages are pending. The backlog goes out with the
+        # next message the classifier does not rule out.
+        # If scoring fails, the keyword heuristic decides instead.
+        p_add = None if self._local_eval is None else add_probability(self._local_eval, message.text)
+        if p_add is not None:
+            if p_add <= STORE_THRESHOLD:
+                self._store_pending(message)
+                return False
+            return True
+
+        if not self._cheap_should_consider(message) and len(self.pending_context) < PENDING_BATCH_SIZE:
+            self._store_pending(message)
+            return False
 
-CONTEXT:
-{context_section}
+        return True
 
-Remember: ONLY respond with the summary document. Do NOT address me in the response. 
-Do NOT write anything meta in the response.
-"""
+    def _update_request(self, message: IncomingMessage) -> Dict:
+        update_message = UPDATE_MESSAGE_TEMPLATE.format(
+            timestamp=message.timestamp,
+            stream_id=message.stream_id,
+            text=message.text
+        )
 
-        summary_response = self.client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1000,
-            temperature=0,
-            messages=[{
-                "role": "user",
-                "content": summary_prompt
-            }]
+        return self._request(
+            self._update_system,
+            self._context_blocks(message) + [_text_block(update_message)],
+            prefill=UPDATE_PREFILL,
+            model=self.model,
+            max_tokens=1200,
+            temperature=0
         )
 
-        self.summary = summary_response.content[0].text
-        self.timeline += "\n" + timeline_update
+    def _update_failed(self, message: IncomingMessage, error: Exception) -> bool:
+        print(f"Error during message update: {error}")
+        self._store_pending(message)
+        return False
+
+    def _apply_update(self, message: IncomingMessage, update_response) -> bool:
+        if not update_response.content:
+            print(f"Warning: Empty response received: {update_response}")
+            self._store_pending(message)
+            return False
+
+        response_text = update_response.content[0].text
+        should_add = response_text.lstrip()[:1].upper() == "A"
+        print(f"Evaluation response: {'ADD' if should_add else 'STORE'}")  # Debug line
+
+        update = _parse_update(UPDATE_PREFILL + response_text)
+        timeline_update = update.get("timeline_entry", "").strip()
+        if not should_add or not timeline_update:
+            self._store_pending(message)
+            return False
+
+        self.summary = update.get("summary", "").strip() or self.summary
+        self.timeline_entries.append(timeline_update)
         self.pending_context = []
 
-        return True
\ No newline at end of file
+        return True
+
+    def process_message(
+            self,
+            message: IncomingMessage,
+            on_summary: Optional[Callable[[str], None]] = None
+    ) -> bool:
+        # With on_summary, the reply is streamed and on_summary is called with
+        # the partial summary as it arrives, before the update is committed.
+        if not self._needs_update_call(message):
+            return False
+
+        request = self._update_request(message)
+        request_key = _request_key(request)
+        update_response = _recall_response(request_key, on_summary)
+        if update_response is None:
+            try:
+                if on_summary is None:
+                    update_response = self.client.messages.create(**request)
+                else:
+                    summary_stream = _SummaryStream(on_summary)
+                    with self.client.messages.stream(**request) as stream:
+                        for text in stream.text_stream:
+                            summary_stream.feed(text)
+                        update_response = stream.get_final_message()
+            except Exception as e:
+                return self._update_failed(message, e)
+            _remember_response(request_key, update_response)
+
+        return self._apply_update(message, update_response)
+
+    async def aprocess_message(
+            self,
+            message: IncomingMessage,
+            on_summary: Optional[Callable[[str], None]] = None
+    ) -> bool:
+        # Same as process_message, but awaits the API call so that several
+        # workstreams can be fed concurrently, e.g. with asyncio.gather.
+        # Messages for one workstream must still be awaited in order.
+        if not self._needs_update_call(message):
+            return False
+
+        request = self._update_request(message)
+        request_key = _request_key(request)
+        update_response = _recall_response(request_key, on_summary)
+        if update_response is None:
+            try:
+                aclient = await self._async_client()
+                if on_summary is None:
+                    update_response = await aclient.messages.create(**request)
+                else:
+                    summary_stream = _SummaryStream(on_summary)
+                    async with aclient.messages.stream(**request) as stream:
+                        async for text in stream.text_stream:
+                            summary_stream.feed(text)
+                        update_response = await stream.get_final_message()
+            except Exception as e:
+                return self._update_failed(message, e)
+            _remember_response(request_key, update_response)
+
+        return self._apply_update(message, update_response)